@@ -0,0 +1,165 @@
+import asyncio
+import argparse
+import json
+import logging
+import math
+import time
+from typing import Dict, List, Any, Optional
+from urllib.parse import urlsplit
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATHS = [
+    '/platforms/shopify/stats',
+    '/platforms/woocommerce/stats',
+    '/merchants/SHOP001/metrics',
+    '/merchants?limit=100',
+]
+
+class HTTPClient:
+    """Minimal keep-alive HTTP/1.1 client, enough to time JSON endpoints without extra dependencies"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+    async def get(self, path: str) -> int:
+        """Send a GET and read the full response, returning the status code"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nAccept: application/json\r\n\r\n'.encode()
+        )
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed by server')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        else:
+            await self.reader.read()
+            await self.close()
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+async def run_client(client_id: int, base_url: str, paths: List[str], deadline: float,
+                     latencies: List[float], errors: Dict[str, int]):
+    """Issue requests back to back, cycling through paths, until the deadline"""
+    url = urlsplit(base_url)
+    client = HTTPClient(url.hostname, url.port or 80)
+    index = client_id
+    try:
+        while time.perf_counter() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                status = await client.get(path)
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError) as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                await client.close()
+                continue
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+    finally:
+        await client.close()
+
+async def run_load_test(base_url: str, clients: int, duration: float,
+                        paths: List[str], label: str = '') -> Dict[str, Any]:
+    """Run `clients` concurrent clients for `duration` seconds and summarize latencies"""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        run_client(client_id, base_url, paths, deadline, latencies, errors)
+        for client_id in range(clients)
+    ))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'label': label,
+        'base_url': base_url,
+        'clients': clients,
+        'duration': elapsed,
+        'paths': paths,
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_sec': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'p50': percentile(latencies, 50) * 1000,
+            'p90': percentile(latencies, 90) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': (latencies[-1] if latencies else 0.0) * 1000
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure API latency under concurrent clients')
+    parser.add_argument('--base-url', default='http://localhost:8001', help='API base URL')
+    parser.add_argument('--clients', type=int, default=50, help='Number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='Test duration in seconds')
+    parser.add_argument('--path', action='append', dest='paths',
+                       help='Path to request (repeatable, defaults to the stats and metrics endpoints)')
+    parser.add_argument('--label', default='', help='Label stored with the results, e.g. "before" or "after"')
+    parser.add_argument('--output', help='Write the JSON results to this file')
+    args = parser.parse_args()
+
+    try:
+        result = asyncio.run(run_load_test(args.base_url, args.clients, args.duration,
+                                           args.paths or DEFAULT_PATHS, args.label))
+    except KeyboardInterrupt:
+        logger.info("Load test interrupted by user")
+        return
+
+    latency = result['latency_ms']
+    logger.info(
+        f"{result['requests']} requests from {result['clients']} clients in {result['duration']:.1f}s "
+        f"({result['requests_per_sec']:.0f} req/s): p50 {latency['p50']:.1f}ms, "
+        f"p90 {latency['p90']:.1f}ms, p99 {latency['p99']:.1f}ms, max {latency['max']:.1f}ms"
+    )
+    if result['errors']:
+        logger.warning(f"Errors: {result['errors']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
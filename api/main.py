@@ -1,53 +1,211 @@
 # FastAPI application for the e-commerce API
-from fastapi import FastAPI, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func, literal_column
+from sqlalchemy.dialects.postgresql import array_agg, aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, AsyncIterator, Awaitable, Callable, Hashable
+from pydantic import BaseModel
 from . import schemas
-from .database import SessionLocal, engine
-from datetime import datetime
+from .database import AsyncSessionLocal, engine, get_async_db
+from .utils.cache import ResponseCache
+from .utils.pagination import keyset_paginate
+from datetime import datetime, timedelta, timezone
+import csv
+import io
+import json
+import os
 
 schemas.Base.metadata.create_all(bind=engine)
 
 app = FastAPI()
 
-def get_db():
-    db = SessionLocal()
+# Rendered responses for the metrics endpoints, invalidated on every ingest generation
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("API_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("API_CACHE_TTL", "60"))
+)
+
+async def get_ingest_generation(db: AsyncSession) -> int:
+    """Current ingest generation, bumped by the ingest side once per tick"""
+    generation = await db.scalar(
+        select(schemas.IngestGeneration.generation).where(schemas.IngestGeneration.id == 1)
+    )
+    return generation or 0
+
+async def cached_response(request: Request, db: AsyncSession, key: Hashable,
+                          build: Callable[[], Awaitable[BaseModel]]) -> Response:
+    """Serve a JSON response from the cache, building it on a miss.
+    
+    The ETag is the ingest generation, so clients sending a matching
+    If-None-Match get a 304. The ETag is shared by every URL, so the
+    response is resolved first (from the cache when possible): a resource
+    that does not exist raises from build (e.g. 404) instead of matching.
+    Errors raised by build are not cached.
+    """
+    generation = await get_ingest_generation(db)
+    etag = f'"{generation}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    
+    body = response_cache.get(key, generation)
+    if body is None:
+        body = (await build()).model_dump_json()
+        response_cache.set(key, generation, body)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        response_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Columns returned by the merchant listing and export endpoints
+MERCHANT_EXPORT_FIELDS = [
+    "merchant_id", "platform", "merchant_name", "total_sales", "total_orders",
+    "average_order_value", "total_customers", "total_products", "created_at", "updated_at"
+]
+
+# Rows fetched per round-trip from the server-side cursor during exports
+EXPORT_BATCH_SIZE = 1000
+
+@app.get("/merchants", response_model=schemas.MerchantPage)
+async def list_merchants(
+    platform: Optional[str] = Query(None, description="Filter by platform (shopify or woocommerce)"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of merchants per page"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    List merchant metrics ordered by (merchant_id, platform).
+    
+    - Uses keyset pagination, so deep pages cost the same as the first one
+    - Pass the returned next_cursor to fetch the following page; it is null on the last page
+    """
+    statement = select(*(getattr(schemas.MerchantPlatformMetrics, field) for field in MERCHANT_EXPORT_FIELDS))
+    key_columns = [schemas.MerchantPlatformMetrics.merchant_id, schemas.MerchantPlatformMetrics.platform]
+    
+    if platform:
+        if platform not in ['shopify', 'woocommerce']:
+            raise HTTPException(status_code=400, detail="Invalid platform. Must be 'shopify' or 'woocommerce'")
+        statement = statement.where(schemas.MerchantPlatformMetrics.platform == platform)
+        # merchant_id is unique within a platform; seeking on it alone lets the
+        # (platform, merchant_id) index serve both the filter and the cursor
+        key_columns = [schemas.MerchantPlatformMetrics.merchant_id]
+    
     try:
-        yield db
-    finally:
-        db.close()
+        merchants, next_cursor = await keyset_paginate(db, statement, key_columns, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return schemas.MerchantPage(
+        data=[
+            schemas.MerchantPlatformRecord(**m._mapping)
+            for m in merchants
+        ],
+        next_cursor=next_cursor
+    )
+
+async def _stream_merchants(platform: Optional[str], export_format: str) -> AsyncIterator[str]:
+    """Yield every merchant row as NDJSON or CSV lines from a server-side cursor"""
+    # The response outlives request dependencies, so the generator owns its session
+    async with AsyncSessionLocal() as db:
+        statement = select(*(getattr(schemas.MerchantPlatformMetrics, field) for field in MERCHANT_EXPORT_FIELDS))
+        if platform:
+            statement = statement.where(schemas.MerchantPlatformMetrics.platform == platform)
+        statement = statement.order_by(
+            schemas.MerchantPlatformMetrics.merchant_id, schemas.MerchantPlatformMetrics.platform
+        ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == "csv":
+            writer.writerow(MERCHANT_EXPORT_FIELDS)
+            yield buffer.getvalue()
+        
+        async for row in await db.stream(statement):
+            values = [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            if export_format == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerow(values)
+                yield buffer.getvalue()
+            else:
+                yield json.dumps(dict(zip(MERCHANT_EXPORT_FIELDS, values))) + "\n"
+
+@app.get("/merchants/export")
+async def export_merchants(
+    platform: Optional[str] = Query(None, description="Filter by platform (shopify or woocommerce)"),
+    format: str = Query("ndjson", description="Export format (ndjson or csv)")
+):
+    """
+    Stream all merchant metrics as NDJSON or CSV.
+    
+    - Rows are read from a server-side cursor in batches, so memory use is constant
+    - Ordered by (merchant_id, platform), like the paginated listing
+    """
+    if platform and platform not in ['shopify', 'woocommerce']:
+        raise HTTPException(status_code=400, detail="Invalid platform. Must be 'shopify' or 'woocommerce'")
+    if format not in ['ndjson', 'csv']:
+        raise HTTPException(status_code=400, detail="Invalid format. Must be 'ndjson' or 'csv'")
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_merchants(platform, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="merchants.{format}"'}
+    )
 
 @app.get("/merchants/{merchant_id}/metrics", response_model=schemas.MerchantMetrics)
 async def get_merchant_metrics(
     merchant_id: str,
+    request: Request,
     platform: Optional[str] = Query(None, description="Filter by platform (shopify or woocommerce)"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get metrics for a merchant across all platforms.
     Optionally filter by a specific platform.
     """
-    query = db.query(schemas.MerchantPlatformMetrics).filter(
-        schemas.MerchantPlatformMetrics.merchant_id == merchant_id
+    if platform and platform not in ['shopify', 'woocommerce']:
+        raise HTTPException(status_code=400, detail="Invalid platform. Must be 'shopify' or 'woocommerce'")
+    
+    return await cached_response(
+        request, db, ("merchant_metrics", merchant_id, platform),
+        lambda: build_merchant_metrics(db, merchant_id, platform)
     )
+
+async def build_merchant_metrics(db: AsyncSession, merchant_id: str,
+                                 platform: Optional[str]) -> schemas.MerchantMetrics:
+    """Load a merchant's platform rows with the cross-platform totals summed in SQL"""
+    model = schemas.MerchantPlatformMetrics
+    statement = select(
+        model.platform,
+        model.merchant_name,
+        model.total_sales,
+        model.total_orders,
+        model.average_order_value,
+        model.total_customers,
+        model.total_products,
+        model.updated_at,
+        func.sum(model.total_sales).over().label("sum_sales"),
+        func.sum(model.total_orders).over().label("sum_orders"),
+        func.sum(model.total_customers).over().label("sum_customers")
+    ).where(model.merchant_id == merchant_id)
     
     if platform:
-        if platform not in ['shopify', 'woocommerce']:
-            raise HTTPException(status_code=400, detail="Invalid platform. Must be 'shopify' or 'woocommerce'")
-        query = query.filter(schemas.MerchantPlatformMetrics.platform == platform)
+        statement = statement.where(model.platform == platform)
     
-    metrics = query.all()
+    metrics = (await db.execute(statement.order_by(model.platform))).all()
     
     if not metrics:
         raise HTTPException(status_code=404, detail="Merchant not found")
     
-    # Calculate aggregated totals
-    total_sales = sum(m.total_sales for m in metrics)
-    total_orders = sum(m.total_orders for m in metrics)
-    total_customers = sum(m.total_customers for m in metrics)
+    # Totals are the same on every row
+    total_sales = float(metrics[0].sum_sales)
+    total_orders = int(metrics[0].sum_orders)
+    total_customers = int(metrics[0].sum_customers)
     avg_order_value = total_sales / total_orders if total_orders > 0 else 0
     
-    # Convert database models to response models
+    # Convert rows to response models
     platform_stats = [
         schemas.MerchantPlatformStats(
             platform=m.platform,
@@ -71,16 +229,24 @@ async def get_merchant_metrics(
     )
 
 @app.get("/platforms/{platform}/stats", response_model=schemas.PlatformStats)
-async def get_platform_stats(platform: str, db: Session = Depends(get_db)):
+async def get_platform_stats(platform: str, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Get aggregated statistics for a specific platform.
+    Served from the platform_rollups table in a single primary-key read.
     """
     if platform not in ['shopify', 'woocommerce']:
         raise HTTPException(status_code=400, detail="Invalid platform. Must be 'shopify' or 'woocommerce'")
     
-    merchants = db.query(schemas.MerchantPlatformMetrics).filter(schemas.MerchantPlatformMetrics.platform == platform).all()
+    return await cached_response(
+        request, db, ("platform_stats", platform),
+        lambda: build_platform_stats(db, platform)
+    )
+
+async def build_platform_stats(db: AsyncSession, platform: str) -> schemas.PlatformStats:
+    """Read a platform's rollup row into the response model"""
+    rollup = await db.get(schemas.PlatformRollup, platform)
     
-    if not merchants:
+    if not rollup:
         return schemas.PlatformStats(
             platform=platform,
             total_merchants=0,
@@ -91,21 +257,175 @@ async def get_platform_stats(platform: str, db: Session = Depends(get_db)):
             total_products=0
         )
     
-    total_sales = sum(m.total_sales for m in merchants)
-    total_orders = sum(m.total_orders for m in merchants)
-    total_customers = sum(m.total_customers for m in merchants)
-    total_products = sum(m.total_products for m in merchants)
-    avg_order_value = total_sales / total_orders if total_orders > 0 else 0
+    total_sales = float(rollup.total_sales)
+    avg_order_value = total_sales / rollup.total_orders if rollup.total_orders > 0 else 0
     
     return schemas.PlatformStats(
         platform=platform,
-        total_merchants=len(merchants),
+        total_merchants=rollup.total_merchants,
         total_sales=total_sales,
-        total_orders=total_orders,
+        total_orders=rollup.total_orders,
         average_order_value=avg_order_value,
-        total_customers=total_customers,
-        total_products=total_products
+        total_customers=rollup.total_customers,
+        total_products=rollup.total_products
+    )
+
+# Downsampling buckets for the history endpoints and their default window
+HISTORY_WINDOWS = {
+    "hour": timedelta(days=7),
+    "day": timedelta(days=90)
+}
+
+def history_window(bucket: str, start: Optional[datetime], end: Optional[datetime]):
+    """Validate the bucket and resolve the [start, end) range, treating naive times as UTC"""
+    if bucket not in HISTORY_WINDOWS:
+        raise HTTPException(status_code=400, detail="Invalid bucket. Must be 'hour' or 'day'")
+    end = end or datetime.now(timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    start = start or end - HISTORY_WINDOWS[bucket]
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+def last_in_bucket(column, ts_column):
+    """Value of column at the latest ts within each group"""
+    return array_agg(aggregate_order_by(column, ts_column.desc()))[1]
+
+@app.get("/merchants/{merchant_id}/history", response_model=schemas.MerchantHistory)
+async def get_merchant_history(
+    merchant_id: str,
+    request: Request,
+    platform: Optional[str] = Query(None, description="Filter by platform (shopify or woocommerce)"),
+    bucket: str = Query("hour", description="Bucket size (hour or day)"),
+    start: Optional[datetime] = Query(None, description="Range start, defaults to 7 days (hour) or 90 days (day) before end"),
+    end: Optional[datetime] = Query(None, description="Range end (exclusive), defaults to now"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get a merchant's metrics history downsampled to hourly or daily buckets.
+    
+    - Each point holds the last recorded values in its bucket, per platform
+    - History is only recorded when a merchant's metrics change, so a missing bucket means no change
+    """
+    if platform and platform not in ['shopify', 'woocommerce']:
+        raise HTTPException(status_code=400, detail="Invalid platform. Must be 'shopify' or 'woocommerce'")
+    # Cache on the requested range so open-ended windows share an entry until the next ingest
+    window_start, window_end = history_window(bucket, start, end)
+    
+    return await cached_response(
+        request, db, ("merchant_history", merchant_id, platform, bucket, start, end),
+        lambda: build_merchant_history(db, merchant_id, platform, bucket, window_start, window_end)
+    )
+
+async def build_merchant_history(db: AsyncSession, merchant_id: str, platform: Optional[str],
+                                 bucket: str, start: datetime, end: datetime) -> schemas.MerchantHistory:
+    """Bucket a merchant's history rows in SQL; the ts range prunes to the matching partitions"""
+    model = schemas.MerchantMetricsHistory
+    # bucket is validated against HISTORY_WINDOWS, so it is safe to inline; a
+    # literal keeps the SELECT and GROUP BY expressions identical
+    bucket_start = func.date_trunc(literal_column(f"'{bucket}'"), model.ts)
+    statement = select(
+        model.platform,
+        bucket_start.label("bucket"),
+        last_in_bucket(model.total_sales, model.ts).label("total_sales"),
+        last_in_bucket(model.total_orders, model.ts).label("total_orders"),
+        last_in_bucket(model.average_order_value, model.ts).label("average_order_value"),
+        last_in_bucket(model.total_customers, model.ts).label("total_customers"),
+        last_in_bucket(model.total_products, model.ts).label("total_products"),
+        func.count().label("samples")
+    ).where(
+        model.merchant_id == merchant_id,
+        model.ts >= start,
+        model.ts < end
     )
+    
+    if platform:
+        statement = statement.where(model.platform == platform)
+    
+    statement = statement.group_by(model.platform, bucket_start).order_by(model.platform, bucket_start)
+    rows = (await db.execute(statement)).all()
+    
+    return schemas.MerchantHistory(
+        merchant_id=merchant_id,
+        bucket=bucket,
+        start=start,
+        end=end,
+        points=[schemas.MerchantHistoryPoint(**row._mapping) for row in rows]
+    )
+
+@app.get("/platforms/{platform}/history", response_model=schemas.PlatformHistory)
+async def get_platform_history(
+    platform: str,
+    request: Request,
+    bucket: str = Query("hour", description="Bucket size (hour or day)"),
+    start: Optional[datetime] = Query(None, description="Range start, defaults to 7 days (hour) or 90 days (day) before end"),
+    end: Optional[datetime] = Query(None, description="Range end (exclusive), defaults to now"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get a platform's aggregated statistics history downsampled to hourly or daily buckets.
+    
+    - Each point holds the last platform totals snapshotted in its bucket
+    """
+    if platform not in ['shopify', 'woocommerce']:
+        raise HTTPException(status_code=400, detail="Invalid platform. Must be 'shopify' or 'woocommerce'")
+    # Cache on the requested range so open-ended windows share an entry until the next ingest
+    window_start, window_end = history_window(bucket, start, end)
+    
+    return await cached_response(
+        request, db, ("platform_history", platform, bucket, start, end),
+        lambda: build_platform_history(db, platform, bucket, window_start, window_end)
+    )
+
+async def build_platform_history(db: AsyncSession, platform: str, bucket: str,
+                                 start: datetime, end: datetime) -> schemas.PlatformHistory:
+    """Bucket a platform's rollup snapshots in SQL"""
+    model = schemas.PlatformMetricsHistory
+    bucket_start = func.date_trunc(literal_column(f"'{bucket}'"), model.ts)
+    statement = select(
+        bucket_start.label("bucket"),
+        last_in_bucket(model.total_merchants, model.ts).label("total_merchants"),
+        last_in_bucket(model.total_sales, model.ts).label("total_sales"),
+        last_in_bucket(model.total_orders, model.ts).label("total_orders"),
+        last_in_bucket(model.total_customers, model.ts).label("total_customers"),
+        last_in_bucket(model.total_products, model.ts).label("total_products")
+    ).where(
+        model.platform == platform,
+        model.ts >= start,
+        model.ts < end
+    ).group_by(bucket_start).order_by(bucket_start)
+    rows = (await db.execute(statement)).all()
+    
+    return schemas.PlatformHistory(
+        platform=platform,
+        bucket=bucket,
+        start=start,
+        end=end,
+        points=[
+            schemas.PlatformHistoryPoint(
+                bucket=row.bucket,
+                total_merchants=row.total_merchants,
+                total_sales=float(row.total_sales),
+                total_orders=row.total_orders,
+                average_order_value=float(row.total_sales) / row.total_orders if row.total_orders > 0 else 0,
+                total_customers=row.total_customers,
+                total_products=row.total_products
+            ) for row in rows
+        ]
+    )
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Response cache counters.
+    
+    - Hits, misses, LRU evictions, TTL expirations, generation invalidations and 304s
+    - Current size, capacity, TTL and the ingest generation the cache holds
+    """
+    return response_cache.snapshot()
 
 @app.get("/health")
 async def health_check():
@@ -1,10 +1,10 @@
 # SQLAlchemy model for merchant metrics
-from sqlalchemy import Column, Integer, String, DateTime, Float
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Float, Numeric
 from sqlalchemy.sql import func
 from datetime import datetime
 from .database import Base
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 # Database model for storing merchant metrics per platform
 class MerchantPlatformMetrics(Base):
@@ -21,12 +21,63 @@ class MerchantPlatformMetrics(Base):
     total_products = Column(Integer, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    fingerprint = Column(BigInteger, nullable=True)
 
     __table_args__ = (
         # Ensure a merchant can only have one record per platform
         {'sqlite_autoincrement': True},
     )
 
+# Per-platform totals maintained by triggers on merchant_metrics
+class PlatformRollup(Base):
+    __tablename__ = "platform_rollups"
+
+    platform = Column(String(50), primary_key=True)
+    total_merchants = Column(BigInteger, nullable=False, default=0)
+    total_sales = Column(Numeric(18, 2), nullable=False, default=0)
+    total_orders = Column(BigInteger, nullable=False, default=0)
+    total_customers = Column(BigInteger, nullable=False, default=0)
+    total_products = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# Single-row counter bumped by the ingest side once per ingest tick
+class IngestGeneration(Base):
+    __tablename__ = "ingest_generation"
+
+    id = Column(Integer, primary_key=True)
+    generation = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# Append-only merchant history, range-partitioned by day on ts
+class MerchantMetricsHistory(Base):
+    __tablename__ = "merchant_metrics_history"
+
+    # Primary key column order gives the (merchant_id, platform, ts) index
+    merchant_id = Column(String(10), primary_key=True)
+    platform = Column(String(50), primary_key=True)
+    ts = Column(DateTime(timezone=True), primary_key=True)
+    total_sales = Column(Float, nullable=False)
+    total_orders = Column(Integer, nullable=False)
+    average_order_value = Column(Float, nullable=False)
+    total_customers = Column(Integer, nullable=False)
+    total_products = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        {'postgresql_partition_by': 'RANGE (ts)'},
+    )
+
+# Per-tick snapshots of platform_rollups
+class PlatformMetricsHistory(Base):
+    __tablename__ = "platform_metrics_history"
+
+    platform = Column(String(50), primary_key=True)
+    ts = Column(DateTime(timezone=True), primary_key=True)
+    total_merchants = Column(BigInteger, nullable=False)
+    total_sales = Column(Numeric(18, 2), nullable=False)
+    total_orders = Column(BigInteger, nullable=False)
+    total_customers = Column(BigInteger, nullable=False)
+    total_products = Column(BigInteger, nullable=False)
+
 # Response models for the API
 class PlatformStats(BaseModel):
     platform: str
@@ -46,6 +97,55 @@ class MerchantPlatformStats(BaseModel):
     total_products: int
     updated_at: datetime
 
+class MerchantPlatformRecord(BaseModel):
+    merchant_id: str
+    platform: str
+    merchant_name: str
+    total_sales: float
+    total_orders: int
+    average_order_value: float
+    total_customers: int
+    total_products: int
+    created_at: datetime
+    updated_at: datetime
+
+class MerchantPage(BaseModel):
+    data: List[MerchantPlatformRecord]
+    next_cursor: Optional[str] = None
+
+class MerchantHistoryPoint(BaseModel):
+    platform: str
+    bucket: datetime
+    total_sales: float
+    total_orders: int
+    average_order_value: float
+    total_customers: int
+    total_products: int
+    samples: int
+
+class MerchantHistory(BaseModel):
+    merchant_id: str
+    bucket: str
+    start: datetime
+    end: datetime
+    points: List[MerchantHistoryPoint]
+
+class PlatformHistoryPoint(BaseModel):
+    bucket: datetime
+    total_merchants: int
+    total_sales: float
+    total_orders: int
+    average_order_value: float
+    total_customers: int
+    total_products: int
+
+class PlatformHistory(BaseModel):
+    platform: str
+    bucket: str
+    start: datetime
+    end: datetime
+    points: List[PlatformHistoryPoint]
+
 class MerchantMetrics(BaseModel):
     merchant_id: str
     merchant_name: str
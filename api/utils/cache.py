@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+class ResponseCache:
+    """Bounded in-process cache with per-entry TTL and LRU eviction.
+
+    Entries belong to an ingest generation: when a lookup arrives with a
+    newer generation than the cache holds, every entry is dropped, so
+    responses never outlive the data they were built from.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation: Optional[int] = None
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'not_modified': 0
+        }
+
+    def _sync_generation(self, generation: int):
+        """Drop all entries if the ingest side has written a new generation"""
+        if generation != self.generation:
+            if self._entries:
+                self.stats['invalidations'] += 1
+                self._entries.clear()
+            self.generation = generation
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        """Return the cached value for key, or None if missing, expired or stale"""
+        with self._lock:
+            self._sync_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+
+    def set(self, key: Hashable, generation: int, value: Any):
+        """Store value for key, evicting the least recently used entries if full"""
+        with self._lock:
+            self._sync_generation(generation)
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def record_not_modified(self):
+        """Count a request answered with 304 Not Modified"""
+        with self._lock:
+            self.stats['not_modified'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus current size and generation"""
+        with self._lock:
+            return {
+                **self.stats,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'generation': self.generation
+            }
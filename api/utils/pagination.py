@@ -1,5 +1,9 @@
+import base64
+import json
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Query
-from typing import Tuple
+from typing import Any, List, Optional, Sequence, Tuple
 
 def paginate(query: Query, page: int, per_page: int) -> Tuple[Query, int]:
     """Apply pagination to a SQLAlchemy query.
@@ -14,4 +18,64 @@ def paginate(query: Query, page: int, per_page: int) -> Tuple[Query, int]:
     """
     total = query.count()
     offset = (page - 1) * per_page
-    return query.offset(offset).limit(per_page), total 
\ No newline at end of file
+    return query.offset(offset).limit(per_page), total 
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key of the last row on a page as an opaque cursor."""
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Decode a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    # Sort keys are string columns; anything else would fail in the database
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise ValueError("Invalid cursor")
+    return values
+
+async def keyset_paginate(db: AsyncSession, statement: Select, key_columns: Sequence[Any],
+                          cursor: Optional[str], limit: int) -> Tuple[List[Any], Optional[str]]:
+    """Apply keyset (cursor) pagination to a SQLAlchemy select and run it.
+
+    Rows are ordered by key_columns and the page starts strictly after the
+    row encoded in cursor, so each page is an index range scan regardless of
+    depth instead of an OFFSET that reads and discards every earlier row.
+
+    Args:
+        db: Async session to run the statement on
+        statement: Select returning the rows to paginate
+        key_columns: Columns forming a unique sort key, all selected by statement
+        cursor: Cursor returned with the previous page, or None for the first page
+        limit: Maximum number of items per page
+
+    Returns:
+        Tuple of (page rows, cursor for the next page or None on the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(key_columns):
+            raise ValueError("Invalid cursor")
+        if len(key_columns) == 1:
+            statement = statement.where(key_columns[0] > values[0])
+        else:
+            statement = statement.where(tuple_(*key_columns) > tuple_(*values))
+    result = await db.execute(statement.order_by(*key_columns).limit(limit + 1))
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in key_columns])
+    return rows, next_cursor
@@ -11,12 +11,19 @@ CREATE TABLE IF NOT EXISTS merchant_metrics (
     total_products INTEGER NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    fingerprint BIGINT,  -- Hash of the normalized metrics, used to skip no-op writes
     UNIQUE(merchant_id, platform)  -- Ensure a merchant can only have one record per platform
 );
 
+-- Add the fingerprint column to tables created before it existed
+ALTER TABLE merchant_metrics ADD COLUMN IF NOT EXISTS fingerprint BIGINT;
+
 -- Create index for faster lookups
 CREATE INDEX IF NOT EXISTS idx_merchant_metrics_platform ON merchant_metrics(platform);
 CREATE INDEX IF NOT EXISTS idx_merchant_metrics_merchant_id ON merchant_metrics(merchant_id);
+-- Serves per-platform scans in merchant_id order: the ingest fetch and the
+-- platform-filtered listing, which seeks on merchant_id alone
+CREATE INDEX IF NOT EXISTS idx_merchant_metrics_platform_merchant_id ON merchant_metrics(platform, merchant_id);
 
 -- Create function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -31,4 +38,224 @@ $$ language 'plpgsql';
 CREATE TRIGGER update_merchant_metrics_updated_at
     BEFORE UPDATE ON merchant_metrics
     FOR EACH ROW
-    EXECUTE FUNCTION update_updated_at_column(); 
\ No newline at end of file
+    EXECUTE FUNCTION update_updated_at_column(); 
+
+-- Per-platform rollup of merchant_metrics, kept current by the triggers below
+CREATE TABLE IF NOT EXISTS platform_rollups (
+    platform VARCHAR(50) PRIMARY KEY,
+    total_merchants BIGINT NOT NULL DEFAULT 0,
+    total_sales DECIMAL(18,2) NOT NULL DEFAULT 0,
+    total_orders BIGINT NOT NULL DEFAULT 0,
+    total_customers BIGINT NOT NULL DEFAULT 0,
+    total_products BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Seed the rollup from existing merchants so the triggers below start from
+-- correct totals when this runs against a populated database
+INSERT INTO platform_rollups
+    (platform, total_merchants, total_sales, total_orders, total_customers, total_products)
+SELECT platform, COUNT(*), COALESCE(SUM(total_sales), 0), COALESCE(SUM(total_orders), 0),
+       COALESCE(SUM(total_customers), 0), COALESCE(SUM(total_products), 0)
+FROM merchant_metrics
+GROUP BY platform
+ON CONFLICT (platform) DO NOTHING;
+
+-- Apply the net change of one statement to platform_rollups: subtract the old
+-- row values, add the new ones. Statement-level so a bulk upsert touches each
+-- rollup row once instead of once per merchant.
+CREATE OR REPLACE FUNCTION apply_platform_rollup_delta()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO platform_rollups AS r
+            (platform, total_merchants, total_sales, total_orders, total_customers, total_products)
+        SELECT platform, COUNT(*), SUM(total_sales), SUM(total_orders),
+               SUM(total_customers), SUM(total_products)
+        FROM new_rows
+        GROUP BY platform
+        ON CONFLICT (platform) DO UPDATE SET
+            total_merchants = r.total_merchants + EXCLUDED.total_merchants,
+            total_sales = r.total_sales + EXCLUDED.total_sales,
+            total_orders = r.total_orders + EXCLUDED.total_orders,
+            total_customers = r.total_customers + EXCLUDED.total_customers,
+            total_products = r.total_products + EXCLUDED.total_products,
+            updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO platform_rollups AS r
+            (platform, total_merchants, total_sales, total_orders, total_customers, total_products)
+        SELECT platform, SUM(merchants), SUM(sales), SUM(orders), SUM(customers), SUM(products)
+        FROM (
+            SELECT platform, -1 AS merchants, -total_sales AS sales, -total_orders AS orders,
+                   -total_customers AS customers, -total_products AS products
+            FROM old_rows
+            UNION ALL
+            SELECT platform, 1, total_sales, total_orders, total_customers, total_products
+            FROM new_rows
+        ) delta
+        GROUP BY platform
+        ON CONFLICT (platform) DO UPDATE SET
+            total_merchants = r.total_merchants + EXCLUDED.total_merchants,
+            total_sales = r.total_sales + EXCLUDED.total_sales,
+            total_orders = r.total_orders + EXCLUDED.total_orders,
+            total_customers = r.total_customers + EXCLUDED.total_customers,
+            total_products = r.total_products + EXCLUDED.total_products,
+            updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE platform_rollups r SET
+            total_merchants = r.total_merchants - d.merchants,
+            total_sales = r.total_sales - d.sales,
+            total_orders = r.total_orders - d.orders,
+            total_customers = r.total_customers - d.customers,
+            total_products = r.total_products - d.products,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT platform, COUNT(*) AS merchants, SUM(total_sales) AS sales,
+                   SUM(total_orders) AS orders, SUM(total_customers) AS customers,
+                   SUM(total_products) AS products
+            FROM old_rows
+            GROUP BY platform
+        ) d
+        WHERE r.platform = d.platform;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Transition tables allow only one event per trigger, so each event gets its own
+CREATE TRIGGER merchant_metrics_rollup_insert
+    AFTER INSERT ON merchant_metrics
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_platform_rollup_delta();
+
+CREATE TRIGGER merchant_metrics_rollup_update
+    AFTER UPDATE ON merchant_metrics
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_platform_rollup_delta();
+
+CREATE TRIGGER merchant_metrics_rollup_delete
+    AFTER DELETE ON merchant_metrics
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_platform_rollup_delta();
+
+-- Generation counter bumped once per ingest tick, after all of its writes;
+-- API response caches are invalidated when it changes
+CREATE TABLE IF NOT EXISTS ingest_generation (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO ingest_generation (id, generation) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+
+-- Append-only history of merchant metrics, one row per merchant change.
+-- Range-partitioned by day so range queries prune to the partitions they need
+-- and retention drops whole partitions instead of deleting rows.
+CREATE TABLE IF NOT EXISTS merchant_metrics_history (
+    ts TIMESTAMP WITH TIME ZONE NOT NULL,
+    merchant_id VARCHAR(10) NOT NULL,
+    platform VARCHAR(50) NOT NULL,
+    total_sales DECIMAL(10,2) NOT NULL,
+    total_orders INTEGER NOT NULL,
+    average_order_value DECIMAL(10,2) NOT NULL,
+    total_customers INTEGER NOT NULL,
+    total_products INTEGER NOT NULL,
+    PRIMARY KEY (merchant_id, platform, ts)
+) PARTITION BY RANGE (ts);
+
+-- Catches rows for days without a partition, so a lapse in partition
+-- maintenance never fails the merchant upsert that writes history
+CREATE TABLE IF NOT EXISTS merchant_metrics_history_default
+    PARTITION OF merchant_metrics_history DEFAULT;
+
+-- Platform totals snapshotted from platform_rollups once per tick
+CREATE TABLE IF NOT EXISTS platform_metrics_history (
+    ts TIMESTAMP WITH TIME ZONE NOT NULL,
+    platform VARCHAR(50) NOT NULL,
+    total_merchants BIGINT NOT NULL,
+    total_sales DECIMAL(18,2) NOT NULL,
+    total_orders BIGINT NOT NULL,
+    total_customers BIGINT NOT NULL,
+    total_products BIGINT NOT NULL,
+    PRIMARY KEY (platform, ts)
+);
+
+-- Create the daily (UTC) history partitions from today through days_ahead.
+-- Rows already written to the default partition for a day are moved into the
+-- new partition before it is attached. Returns the number of partitions created.
+CREATE OR REPLACE FUNCTION ensure_merchant_metrics_history_partitions(days_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    partition_day DATE;
+    partition_name TEXT;
+    range_start TIMESTAMP WITH TIME ZONE;
+    range_end TIMESTAMP WITH TIME ZONE;
+    created INTEGER := 0;
+BEGIN
+    FOR partition_day IN
+        SELECT generate_series(
+            (now() AT TIME ZONE 'UTC')::date::timestamp,
+            ((now() AT TIME ZONE 'UTC')::date + days_ahead)::timestamp,
+            INTERVAL '1 day'
+        )::date
+    LOOP
+        partition_name := 'merchant_metrics_history_p' || to_char(partition_day, 'YYYYMMDD');
+        range_start := partition_day::timestamp AT TIME ZONE 'UTC';
+        range_end := (partition_day + 1)::timestamp AT TIME ZONE 'UTC';
+        IF to_regclass(partition_name) IS NULL THEN
+            BEGIN
+                EXECUTE format(
+                    'CREATE TABLE %I (LIKE merchant_metrics_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                    partition_name
+                );
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM merchant_metrics_history_default WHERE ts >= %L AND ts < %L RETURNING *) '
+                    'INSERT INTO %I SELECT * FROM moved',
+                    range_start, range_end, partition_name
+                );
+                EXECUTE format(
+                    'ALTER TABLE merchant_metrics_history ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, range_start, range_end
+                );
+                created := created + 1;
+            EXCEPTION WHEN duplicate_table THEN
+                -- Created concurrently by another process
+                NULL;
+            END;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$ language 'plpgsql';
+
+-- Drop history partitions that ended before now() - retention and trim the
+-- default partition and the platform snapshots to the same window.
+-- Returns the number of partitions dropped.
+CREATE OR REPLACE FUNCTION apply_metrics_history_retention(retention INTERVAL)
+RETURNS INTEGER AS $$
+DECLARE
+    child RECORD;
+    dropped INTEGER := 0;
+BEGIN
+    FOR child IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'merchant_metrics_history'::regclass
+          AND c.relname ~ '^merchant_metrics_history_p[0-9]{8}$'
+    LOOP
+        IF (to_date(right(child.relname, 8), 'YYYYMMDD') + 1)::timestamp AT TIME ZONE 'UTC' <= now() - retention THEN
+            EXECUTE format('DROP TABLE %I', child.relname);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    DELETE FROM merchant_metrics_history_default WHERE ts < now() - retention;
+    DELETE FROM platform_metrics_history WHERE ts < now() - retention;
+    RETURN dropped;
+END;
+$$ language 'plpgsql';
+
+SELECT ensure_merchant_metrics_history_partitions(3);
@@ -0,0 +1,408 @@
+import asyncio
+import argparse
+import json
+import os
+import platform as host_platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Callable
+import asyncpg
+from dotenv import load_dotenv
+import logging
+from .base import BaseAPI, MerchantGenerator, close_db_pool, get_db_pool
+from .history import maintain_history
+from .shopify import ShopifyAPI
+from .woocommerce import WooCommerceAPI
+from api.loadtest import HTTPClient, run_load_test
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MERCHANTS = 10000
+DEFAULT_TICKS = 3
+DEFAULT_SEED = 42
+DEFAULT_SEED_CHUNK = 50000
+DEFAULT_API_PORT = 8002
+# Share of seeded merchants that also sell on the other platform, as in _create_new_merchant
+CROSS_PLATFORM_RATE = 0.3
+# A drop in throughput (or rise in latency/round trips) beyond this fraction is a regression
+DEFAULT_TOLERANCE = 0.2
+
+# --reset refuses to truncate the main development database
+PROTECTED_DB_NAME = 'commerce_data'
+
+BENCHMARK_TABLES = ('merchant_metrics', 'platform_rollups', 'merchant_metrics_history', 'platform_metrics_history')
+
+class CountingConnection(asyncpg.Connection):
+    """asyncpg connection that counts client/server round trips.
+
+    Every public query method maps to one round trip, including the
+    BEGIN/COMMIT issued by transactions and the reset run when a pool
+    connection is released.
+    """
+    round_trips = 0
+
+    async def execute(self, *args, **kwargs):
+        CountingConnection.round_trips += 1
+        return await super().execute(*args, **kwargs)
+
+    async def executemany(self, *args, **kwargs):
+        CountingConnection.round_trips += 1
+        return await super().executemany(*args, **kwargs)
+
+    async def fetch(self, *args, **kwargs):
+        CountingConnection.round_trips += 1
+        return await super().fetch(*args, **kwargs)
+
+    async def fetchval(self, *args, **kwargs):
+        CountingConnection.round_trips += 1
+        return await super().fetchval(*args, **kwargs)
+
+    async def fetchrow(self, *args, **kwargs):
+        CountingConnection.round_trips += 1
+        return await super().fetchrow(*args, **kwargs)
+
+    async def copy_records_to_table(self, *args, **kwargs):
+        CountingConnection.round_trips += 1
+        return await super().copy_records_to_table(*args, **kwargs)
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KiB on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def timed(func: Callable, timings: Dict[str, float], stage: str) -> Callable:
+    """Wrap func so the time spent in it is added to timings[stage]"""
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[stage] += time.perf_counter() - started
+    return wrapper
+
+def generate_merchant_ids(count: int) -> List[tuple]:
+    """Draw `count` distinct (merchant_id, merchant_name) pairs from MerchantGenerator.
+
+    MerchantGenerator only knows 1,152 names, so the ID is appended to make
+    each name unique. Otherwise every generated name would already be taken
+    and the onboarding path in _create_new_merchant would never run.
+    """
+    merchants = {}
+    while len(merchants) < count:
+        merchant_id, merchant_name = MerchantGenerator.generate_merchant_info()
+        merchants.setdefault(merchant_id, f"{merchant_name} {merchant_id}")
+    return list(merchants.items())
+
+async def reset_tables(pool: asyncpg.Pool):
+    """Empty the merchant, rollup and history tables so every run starts from the same state"""
+    async with pool.acquire() as conn:
+        await conn.execute(f"TRUNCATE {', '.join(BENCHMARK_TABLES)}")
+        await conn.execute('UPDATE ingest_generation SET generation = generation + 1 WHERE id = 1')
+
+async def seed_merchants(apis: Dict[str, BaseAPI], merchants: int, chunk_size: int) -> Dict[str, Any]:
+    """Insert `merchants` merchants spread over the platforms, timing generation and writes.
+
+    Merchants are assigned to platforms round robin, and a share of them
+    also get a row on the next platform. Rows are generated and written in
+    chunks so memory stays bounded at large N.
+    """
+    platforms = list(apis)
+    timings = {'id_generation': 0.0, 'generate': 0.0, 'write': 0.0}
+    round_trips = CountingConnection.round_trips
+
+    started = time.perf_counter()
+    merchant_ids = generate_merchant_ids(merchants)
+    timings['id_generation'] = time.perf_counter() - started
+
+    rows = 0
+    for offset in range(0, merchants, chunk_size):
+        generate_started = time.perf_counter()
+        by_platform: Dict[str, List[Dict[str, Any]]] = {platform: [] for platform in platforms}
+        for index, (merchant_id, merchant_name) in enumerate(merchant_ids[offset:offset + chunk_size], offset):
+            home = index % len(platforms)
+            targets = [platforms[home]]
+            if len(platforms) > 1 and random.random() < CROSS_PLATFORM_RATE:
+                targets.append(platforms[(home + 1) % len(platforms)])
+            for platform in targets:
+                metrics = apis[platform].generate_merchant_metrics(merchant_id, merchant_name)
+                metrics['created_at'] = datetime.utcnow()
+                by_platform[platform].append(metrics)
+        timings['generate'] += time.perf_counter() - generate_started
+
+        write_started = time.perf_counter()
+        for platform, metrics in by_platform.items():
+            rows += await apis[platform].update_metrics(metrics)
+        timings['write'] += time.perf_counter() - write_started
+        logger.info(f"Seeded {min(offset + chunk_size, merchants)}/{merchants} merchants")
+
+    await next(iter(apis.values())).bump_generation()
+    duration = time.perf_counter() - started
+    return {
+        'merchants': merchants,
+        'rows': rows,
+        'duration': duration,
+        'rows_per_sec': rows / duration if duration > 0 else 0.0,
+        'stages': timings,
+        'round_trips': CountingConnection.round_trips - round_trips,
+        'sample_merchant_ids': [merchant_id for merchant_id, _ in merchant_ids[:100]],
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+async def run_tick(api: BaseAPI, semaphore: asyncio.Semaphore, seed: str) -> Dict[str, Any]:
+    """Run one ingest tick for a platform and break its time down by stage.
+
+    generate_merchant_metrics and _apply_growth_factors are wrapped on the
+    instance for the duration of the tick; the rest of the transform time
+    is fingerprinting and change detection.
+    """
+    timings = {'generate': 0.0, 'growth_factors': 0.0}
+    api.generate_merchant_metrics = timed(api.generate_merchant_metrics, timings, 'generate')
+    api._apply_growth_factors = timed(api._apply_growth_factors, timings, 'growth_factors')
+    round_trips = CountingConnection.round_trips
+    try:
+        result = await api.get_merchant_metrics(semaphore, seed=seed)
+    finally:
+        del api.generate_merchant_metrics
+        del api._apply_growth_factors
+
+    stats = result['stats']
+    rows_processed = stats['rows_written'] + stats['rows_skipped']
+    return {
+        'platform': api.platform,
+        'duration': stats['duration'],
+        'rows_written': stats['rows_written'],
+        'rows_skipped': stats['rows_skipped'],
+        'new_merchants': stats['new_merchants'],
+        'rows_per_sec': rows_processed / stats['duration'] if stats['duration'] > 0 else 0.0,
+        'shards': stats['shards'],
+        'failed_shards': stats['failed_shards'],
+        'stages': {
+            'fetch': stats['fetch_time'],
+            'generate': timings['generate'],
+            'growth_factors': timings['growth_factors'],
+            'fingerprint': max(0.0, stats['transform_time'] - timings['generate'] - timings['growth_factors']),
+            'write': stats['write_time']
+        },
+        'round_trips': CountingConnection.round_trips - round_trips,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def start_api_server(port: int) -> subprocess.Popen:
+    """Start the API under uvicorn in a child process"""
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api.main:app', '--port', str(port), '--log-level', 'warning'],
+        env=env
+    )
+
+async def wait_for_api(host: str, port: int, timeout: float = 30.0):
+    """Poll /health until the API answers"""
+    deadline = time.perf_counter() + timeout
+    while True:
+        client = HTTPClient(host, port)
+        try:
+            if await client.get('/health') == 200:
+                return
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            await client.close()
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"API on {host}:{port} did not become healthy within {timeout:.0f}s")
+        await asyncio.sleep(0.5)
+
+def api_paths(platforms: List[str], merchant_ids: List[str]) -> List[str]:
+    """Mix of platform, merchant and listing paths over the seeded merchants"""
+    paths = [f'/platforms/{platform}/stats' for platform in platforms]
+    paths += [f'/merchants/{merchant_id}/metrics' for merchant_id in merchant_ids]
+    paths += [f'/merchants/{merchant_id}/history' for merchant_id in merchant_ids[:10]]
+    paths.append('/merchants?limit=100')
+    return paths
+
+async def run_api_load(base_url: Optional[str], port: int, clients: int, duration: float,
+                       paths: List[str]) -> Dict[str, Any]:
+    """Load the API given by base_url, or a freshly started local one"""
+    server = None
+    if base_url is None:
+        base_url = f'http://127.0.0.1:{port}'
+        server = start_api_server(port)
+    try:
+        host, _, api_port = base_url.split('://', 1)[-1].rstrip('/').partition(':')
+        await wait_for_api(host, int(api_port or 80))
+        return await run_load_test(base_url, clients, duration, paths, label='benchmark')
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """Seed merchants, run ingest ticks and API load, and collect the results"""
+    load_dotenv()
+    db_name = os.getenv('DB_NAME', PROTECTED_DB_NAME)
+    if args.reset and db_name == PROTECTED_DB_NAME:
+        raise ValueError(
+            f"Refusing to --reset the '{db_name}' database; set DB_NAME to a dedicated benchmark database"
+        )
+    random.seed(args.seed)
+    pool = await get_db_pool(connection_class=CountingConnection)
+    apis = {'shopify': ShopifyAPI(), 'woocommerce': WooCommerceAPI()}
+    apis = {platform: apis[platform] for platform in args.platforms}
+    try:
+        async with pool.acquire() as conn:
+            server_version = await conn.fetchval('SHOW server_version')
+        for api in apis.values():
+            await api.connect_db()
+        await maintain_history(pool)
+        if args.reset:
+            await reset_tables(pool)
+
+        logger.info(f"Seeding {args.merchants} merchants across {', '.join(apis)}")
+        seed = await seed_merchants(apis, args.merchants, args.chunk_size)
+        sample_merchant_ids = seed.pop('sample_merchant_ids')
+        logger.info(f"Seeded {seed['rows']} rows in {seed['duration']:.2f}s ({seed['rows_per_sec']:.0f} rows/s)")
+
+        semaphore = asyncio.Semaphore(apis[args.platforms[0]].max_concurrency)
+        ticks = []
+        for tick in range(args.ticks):
+            # Shards draw from their own generators seeded from (seed, tick, shard);
+            # the shared one only feeds merchant onboarding, which runs before them
+            random.seed(args.seed + tick + 1)
+            for api in apis.values():
+                result = await run_tick(api, semaphore, f"{args.seed}:{tick}:{api.platform}")
+                result['tick'] = tick
+                ticks.append(result)
+                logger.info(
+                    f"Tick {tick} {api.platform}: {result['rows_written']} written, "
+                    f"{result['rows_skipped']} skipped in {result['duration']:.2f}s "
+                    f"({result['rows_per_sec']:.0f} rows/s, {result['round_trips']} round trips)"
+                )
+    finally:
+        await close_db_pool()
+
+    api_load = None
+    if not args.skip_api:
+        paths = api_paths(list(apis), sample_merchant_ids)
+        api_load = await run_api_load(args.api_url, args.api_port, args.clients, args.duration, paths)
+        logger.info(
+            f"API: {api_load['requests_per_sec']:.0f} req/s, p50 {api_load['latency_ms']['p50']:.1f}ms, "
+            f"p99 {api_load['latency_ms']['p99']:.1f}ms"
+        )
+
+    any_api = next(iter(apis.values()))
+    return {
+        'config': {
+            'merchants': args.merchants,
+            'ticks': args.ticks,
+            'seed': args.seed,
+            'platforms': args.platforms,
+            'reset': args.reset,
+            'database': db_name,
+            'batch_size': any_api.batch_size,
+            'shard_size': any_api.shard_size,
+            'concurrency': any_api.max_concurrency
+        },
+        'environment': {
+            'python': host_platform.python_version(),
+            'system': host_platform.platform(),
+            'postgres': server_version
+        },
+        'seed': seed,
+        'ticks': ticks,
+        'api': api_load,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def summarize(result: Dict[str, Any]) -> Dict[str, float]:
+    """Headline numbers compared against a baseline"""
+    ticks = result['ticks']
+    summary = {
+        'seed_rows_per_sec': result['seed']['rows_per_sec'],
+        'tick_rows_per_sec': sum(t['rows_per_sec'] for t in ticks) / len(ticks) if ticks else 0.0,
+        'tick_round_trips': sum(t['round_trips'] for t in ticks) / len(ticks) if ticks else 0.0,
+        'peak_rss_mb': result['peak_rss_mb']
+    }
+    if result.get('api'):
+        summary['api_requests_per_sec'] = result['api']['requests_per_sec']
+        summary['api_p99_ms'] = result['api']['latency_ms']['p99']
+    return summary
+
+# Metrics where a larger value is better; the rest regress when they grow
+HIGHER_IS_BETTER = ('seed_rows_per_sec', 'tick_rows_per_sec', 'api_requests_per_sec')
+
+def compare_to_baseline(summary: Dict[str, float], baseline: Dict[str, float],
+                        tolerance: float) -> List[Dict[str, Any]]:
+    """Return the metrics that moved the wrong way by more than `tolerance`"""
+    regressions = []
+    for name, value in summary.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        change = (value - previous) / previous
+        worse = -change if name in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append({'metric': name, 'baseline': previous, 'current': value, 'change': change})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ingest and API at a given merchant scale')
+    parser.add_argument('--merchants', type=int, default=DEFAULT_MERCHANTS, help='Number of merchants to seed')
+    parser.add_argument('--ticks', type=int, default=DEFAULT_TICKS, help='Ingest ticks to run per platform')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='RNG seed for reproducible runs')
+    parser.add_argument('--platforms', nargs='+', choices=['shopify', 'woocommerce'],
+                       default=['shopify', 'woocommerce'], help='Platforms to seed and ingest')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_SEED_CHUNK,
+                       help='Merchants generated and written per seeding chunk')
+    parser.add_argument('--reset', action='store_true',
+                       help='Truncate merchant, rollup and history tables first (refused on the main database)')
+    parser.add_argument('--skip-api', action='store_true', help='Skip the API load phase')
+    parser.add_argument('--api-url', help='Load an already running API instead of starting one')
+    parser.add_argument('--api-port', type=int, default=DEFAULT_API_PORT, help='Port for the API started by the benchmark')
+    parser.add_argument('--clients', type=int, default=50, help='Concurrent API clients')
+    parser.add_argument('--duration', type=float, default=30, help='API load duration in seconds')
+    parser.add_argument('--output', help='Write the JSON results to this file')
+    parser.add_argument('--baseline', help='Compare against a previous results file and exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                       help='Allowed relative regression against the baseline')
+    args = parser.parse_args()
+
+    try:
+        result = asyncio.run(run_benchmark(args))
+    except KeyboardInterrupt:
+        logger.info("Benchmark interrupted by user")
+        return
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}")
+        exit(2)
+
+    result['summary'] = summarize(result)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(result['summary'], baseline.get('summary', {}), args.tolerance)
+        result['regressions'] = regressions
+        for entry in regressions:
+            logger.warning(
+                f"Regression in {entry['metric']}: {entry['baseline']:.2f} -> {entry['current']:.2f} "
+                f"({entry['change']:+.0%})"
+            )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+    if regressions:
+        exit(1)
+
+if __name__ == "__main__":
+    main()
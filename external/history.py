@@ -0,0 +1,28 @@
+import os
+import asyncpg
+import logging
+from datetime import timedelta
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+# Daily partitions created ahead of time, and how long history is kept
+DEFAULT_PARTITIONS_AHEAD = 3
+DEFAULT_RETENTION_DAYS = 90
+
+async def maintain_history(pool: asyncpg.Pool) -> Tuple[int, int]:
+    """Create upcoming merchant_metrics_history partitions and drop expired ones.
+
+    Returns the number of partitions (created, dropped).
+    """
+    days_ahead = int(os.getenv('HISTORY_PARTITIONS_AHEAD', DEFAULT_PARTITIONS_AHEAD))
+    retention = timedelta(days=float(os.getenv('HISTORY_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)))
+    async with pool.acquire() as conn:
+        created = await conn.fetchval('SELECT ensure_merchant_metrics_history_partitions($1)', days_ahead)
+        dropped = await conn.fetchval('SELECT apply_metrics_history_retention($1)', retention)
+        stray = await conn.fetchval('SELECT count(*) FROM merchant_metrics_history_default')
+    if created or dropped:
+        logger.info(f"History maintenance: created {created} partition(s), dropped {dropped} expired partition(s)")
+    if stray:
+        logger.warning(f"{stray} history row(s) are in the default partition; partition maintenance fell behind")
+    return created, dropped
@@ -2,6 +2,8 @@ import asyncio
 import argparse
 from .woocommerce import WooCommerceAPI
 from .shopify import ShopifyAPI
+from .base import close_db_pool, get_db_pool
+from .history import maintain_history
 import logging
 
 # Configure logging
@@ -16,11 +18,14 @@ async def fetch_metrics(platform: str):
     try:
         logger.info(f"Starting metrics fetch for {platform}")
         api = ShopifyAPI() if platform.lower() == 'shopify' else WooCommerceAPI()
+        await maintain_history(await get_db_pool())
         await api.get_merchant_metrics()
         logger.info(f"Successfully completed metrics fetch for {platform}")
     except Exception as e:
         logger.error(f"Error fetching metrics for {platform}: {str(e)}")
         raise
+    finally:
+        await close_db_pool()
 
 def main():
     parser = argparse.ArgumentParser(description='Fetch merchant metrics for a specific platform')
@@ -0,0 +1,111 @@
+import asyncio
+import argparse
+import os
+import asyncpg
+from dotenv import load_dotenv
+import logging
+from typing import Dict, List, Any
+from .base import BUMP_GENERATION_SQL
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ROLLUP_FIELDS = ('total_merchants', 'total_sales', 'total_orders', 'total_customers', 'total_products')
+
+# Recompute the rollup from scratch; used as the source of truth for drift checks
+EXPECTED_ROLLUPS_SQL = '''
+    SELECT platform,
+           COUNT(*) AS total_merchants,
+           COALESCE(SUM(total_sales), 0) AS total_sales,
+           COALESCE(SUM(total_orders), 0) AS total_orders,
+           COALESCE(SUM(total_customers), 0) AS total_customers,
+           COALESCE(SUM(total_products), 0) AS total_products
+    FROM merchant_metrics
+    GROUP BY platform
+'''
+
+async def reconcile_rollups(conn: asyncpg.Connection, fix: bool = True) -> List[Dict[str, Any]]:
+    """Compare platform_rollups against merchant_metrics and optionally rebuild it.
+
+    Writers are blocked for the duration of the check so the comparison is
+    against a consistent snapshot. Returns one entry per drifted field.
+    """
+    async with conn.transaction():
+        await conn.execute('LOCK TABLE merchant_metrics IN SHARE MODE')
+        expected = {row['platform']: row for row in await conn.fetch(EXPECTED_ROLLUPS_SQL)}
+        actual = {row['platform']: row for row in await conn.fetch(
+            f"SELECT platform, {', '.join(ROLLUP_FIELDS)} FROM platform_rollups FOR UPDATE"
+        )}
+
+        drift = []
+        for platform in sorted(set(expected) | set(actual)):
+            for field in ROLLUP_FIELDS:
+                want = expected[platform][field] if platform in expected else 0
+                have = actual[platform][field] if platform in actual else 0
+                if want != have:
+                    drift.append({
+                        'platform': platform,
+                        'field': field,
+                        'expected': want,
+                        'actual': have,
+                        'difference': have - want
+                    })
+
+        if fix and drift:
+            await conn.execute('DELETE FROM platform_rollups')
+            await conn.execute(f'''
+                INSERT INTO platform_rollups (platform, {', '.join(ROLLUP_FIELDS)}, updated_at)
+                SELECT platform, {', '.join(ROLLUP_FIELDS)}, CURRENT_TIMESTAMP
+                FROM ({EXPECTED_ROLLUPS_SQL}) expected
+            ''')
+            await conn.execute(BUMP_GENERATION_SQL)
+        return drift
+
+async def run(fix: bool) -> int:
+    """Connect to the database, reconcile and log the drift report"""
+    load_dotenv()
+    conn = await asyncpg.connect(
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        database=os.getenv('DB_NAME', 'commerce_data'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    try:
+        drift = await reconcile_rollups(conn, fix=fix)
+    finally:
+        await conn.close()
+
+    if not drift:
+        logger.info("Platform rollups are consistent with merchant_metrics")
+        return 0
+
+    for entry in drift:
+        logger.warning(
+            f"Drift on {entry['platform']}.{entry['field']}: "
+            f"expected {entry['expected']}, found {entry['actual']} ({entry['difference']:+})"
+        )
+    if fix:
+        logger.info(f"Rebuilt platform_rollups from merchant_metrics ({len(drift)} drifted fields)")
+    return 1
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile platform_rollups with merchant_metrics')
+    parser.add_argument('--check', action='store_true',
+                       help='Report drift without rebuilding the rollup table')
+    args = parser.parse_args()
+
+    try:
+        exit(asyncio.run(run(fix=not args.check)))
+    except KeyboardInterrupt:
+        logger.info("Reconciliation interrupted by user")
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}")
+        exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,317 @@
 import asyncio
-from datetime import datetime, timedelta
+import json
+import math
+import os
+import signal
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from .base import DEFAULT_CONCURRENCY, close_db_pool, get_db_pool
+from .history import maintain_history
 from .shopify import ShopifyAPI
 from .woocommerce import WooCommerceAPI
 from api.schemas import Base
 from api.database import engine
 
+# What to do when a tick runs past the start of the next one:
+#   skip     - drop the missed ticks and wait for the next aligned boundary
+#   coalesce - run one catch-up tick immediately, then return to the grid
+#   queue    - run every missed tick back to back until caught up
+OVERRUN_POLICIES = ('skip', 'coalesce', 'queue')
+
+DEFAULT_INTERVAL = 60.0
+DEFAULT_OVERRUN_POLICY = 'skip'
+DEFAULT_METRICS_PORT = 9108
+DEFAULT_DRAIN_TIMEOUT = 30.0
+DEFAULT_MAINTENANCE_INTERVAL = 3600.0
+TICK_HISTORY_SIZE = 100
+
 class DataFetcher:
-    def __init__(self):
+    def __init__(self, max_concurrency: Optional[int] = None):
         self.apis = {
             'shopify': ShopifyAPI(),
             'woocommerce': WooCommerceAPI()
         }
+        # One semaphore across all platforms bounds the shards in flight (and
+        # so the connections taken from the shared pool)
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv('FETCH_CONCURRENCY', DEFAULT_CONCURRENCY))
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_platform(self, platform: str) -> Dict[str, Any]:
+        """Fetch metrics from a single platform, returning the tick stats"""
+        print(f"\nFetching metrics from {platform}...")
+        response = await self.apis[platform].get_merchant_metrics(semaphore=self.semaphore)
+        print(f"Successfully fetched {len(response['data'])} merchant metrics from {platform}")
+        return response['stats']
+
+    async def close(self):
+        """Release the shared database pool"""
+        await close_db_pool()
+
+class Scheduler:
+    """Fixed-rate scheduler running each platform on its own wall-clock aligned interval.
+
+    Ticks for a platform never overlap: a tick that runs past the next
+    boundary is handled by the overrun policy. Every tick produces a timing
+    record, kept in a bounded history and exposed over HTTP for scraping.
+    """
+
+    def __init__(self, fetcher: DataFetcher, intervals: Dict[str, float],
+                 overrun_policy: str = DEFAULT_OVERRUN_POLICY,
+                 drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+                 maintenance_interval: float = DEFAULT_MAINTENANCE_INTERVAL):
+        if overrun_policy not in OVERRUN_POLICIES:
+            raise ValueError(f"Invalid overrun policy '{overrun_policy}'. Must be one of {', '.join(OVERRUN_POLICIES)}")
+        self.fetcher = fetcher
+        self.intervals = intervals
+        self.overrun_policy = overrun_policy
+        self.drain_timeout = drain_timeout
+        self.maintenance_interval = maintenance_interval
+        self.history = deque(maxlen=TICK_HISTORY_SIZE)
+        self.counters = {
+            platform: {'ticks': 0, 'errors': 0, 'overruns': 0, 'skipped': 0, 'rows_written': 0, 'rows_skipped': 0,
+                       'failed_shards': 0}
+            for platform in intervals
+        }
+        self._stopping = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    @staticmethod
+    def next_boundary(now: float, interval: float) -> float:
+        """First wall-clock multiple of interval strictly after now"""
+        return (math.floor(now / interval) + 1) * interval
+
+    async def run_tick(self, platform: str, scheduled_at: float) -> Dict[str, Any]:
+        """Run a single tick for a platform and record its timings"""
+        started_at = time.time()
+        print(f"\nStarting scheduled {platform} fetch at {datetime.fromtimestamp(started_at)}")
+        record = {
+            'platform': platform,
+            'scheduled_at': scheduled_at,
+            'started_at': started_at,
+            'lag': started_at - scheduled_at,
+            'status': 'ok',
+            'fetch_time': 0.0,
+            'transform_time': 0.0,
+            'write_time': 0.0,
+            'rows_written': 0,
+            'rows_skipped': 0,
+            'failed_shards': 0
+        }
+        try:
+            stats = await self.fetcher.fetch_platform(platform)
+            for key in ('fetch_time', 'transform_time', 'write_time', 'rows_written', 'rows_skipped', 'failed_shards'):
+                record[key] = stats[key]
+            # A tick whose shards all failed wrote nothing; one with some failures is partial
+            if stats['failed_shards']:
+                record['status'] = 'error' if stats['failed_shards'] == stats['shards'] else 'partial'
+        except Exception as e:
+            record['status'] = 'error'
+            record['error'] = str(e)
+            print(f"Error fetching metrics for {platform}: {str(e)}")
+        record['duration'] = time.time() - started_at
+
+        counters = self.counters[platform]
+        counters['ticks'] += 1
+        counters['rows_written'] += record['rows_written']
+        counters['rows_skipped'] += record['rows_skipped']
+        counters['failed_shards'] += record['failed_shards']
+        if record['status'] != 'ok':
+            counters['errors'] += 1
+        self.history.append(record)
+        print(
+            f"Completed {platform} fetch in {record['duration']:.2f}s "
+            f"(fetch {record['fetch_time']:.2f}s, transform {record['transform_time']:.2f}s, "
+            f"write {record['write_time']:.2f}s, {record['rows_written']} rows written, "
+            f"{record['rows_skipped']} unchanged skipped)"
+        )
+        return record
+
+    async def _platform_loop(self, platform: str):
+        """Run ticks for one platform until stopped"""
+        interval = self.intervals[platform]
+        next_tick = self.next_boundary(time.time(), interval)
+        while not self._stopping.is_set():
+            delay = next_tick - time.time()
+            if delay > 0:
+                print(f"Next {platform} fetch scheduled for {datetime.fromtimestamp(next_tick)}")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), delay)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+
+            await self.run_tick(platform, next_tick)
+            next_tick += interval
+
+            now = time.time()
+            if now < next_tick:
+                continue
+
+            # The tick overran one or more boundaries
+            missed = math.floor((now - next_tick) / interval) + 1
+            self.counters[platform]['overruns'] += 1
+            if self.overrun_policy == 'skip':
+                self.counters[platform]['skipped'] += missed
+                next_tick += missed * interval
+            elif self.overrun_policy == 'coalesce':
+                self.counters[platform]['skipped'] += missed - 1
+                next_tick += (missed - 1) * interval
+            print(f"{platform} tick overran {missed} boundary(s), applying '{self.overrun_policy}' policy")
 
-    async def fetch_all(self):
-        """Fetch metrics from all platforms"""
-        for platform, api in self.apis.items():
+    async def _maintenance_loop(self):
+        """Keep history partitions ahead of the clock and apply retention until stopped"""
+        while not self._stopping.is_set():
             try:
-                print(f"\nFetching metrics from {platform}...")
-                response = await api.get_merchant_metrics()
-                print(f"Successfully fetched {len(response['data'])} merchant metrics from {platform}")
+                await maintain_history(await get_db_pool())
             except Exception as e:
-                print(f"Error fetching metrics for {platform}: {str(e)}")
+                print(f"Error maintaining metrics history: {str(e)}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.maintenance_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        """Ask every platform loop to finish its in-flight tick and exit"""
+        if not self._stopping.is_set():
+            print("\nStopping scheduler, draining in-flight fetches...")
+            self._stopping.set()
+
+    async def run(self):
+        """Run all platform loops until stop() is called, then drain them"""
+        self._tasks = [asyncio.ensure_future(self._platform_loop(platform)) for platform in self.intervals]
+        self._tasks.append(asyncio.ensure_future(self._maintenance_loop()))
+        await self._stopping.wait()
+        done, pending = await asyncio.wait(self._tasks, timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"Cancelled {len(pending)} fetch(es) still running after {self.drain_timeout:.0f}s")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def render_metrics(self) -> str:
+        """Render counters and the latest tick per platform in Prometheus text format"""
+        latest = {}
+        for record in self.history:
+            latest[record['platform']] = record
+
+        lines = [
+            '# HELP scheduler_ticks_total Ticks run per platform.',
+            '# TYPE scheduler_ticks_total counter',
+        ]
+        for platform, counters in self.counters.items():
+            lines.append(f'scheduler_ticks_total{{platform="{platform}"}} {counters["ticks"]}')
+        for name, key, help_text in (
+            ('scheduler_tick_errors_total', 'errors', 'Ticks that failed or had failed shards.'),
+            ('scheduler_failed_shards_total', 'failed_shards', 'Shards that failed after all retries.'),
+            ('scheduler_tick_overruns_total', 'overruns', 'Ticks that ran past the next boundary.'),
+            ('scheduler_ticks_skipped_total', 'skipped', 'Ticks dropped by the overrun policy.'),
+            ('scheduler_rows_written_total', 'rows_written', 'Merchant rows written.'),
+            ('scheduler_rows_skipped_total', 'rows_skipped', 'Unchanged merchant rows not rewritten.'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for platform, counters in self.counters.items():
+                lines.append(f'{name}{{platform="{platform}"}} {counters[key]}')
+
+        lines.append('# HELP scheduler_interval_seconds Configured tick interval.')
+        lines.append('# TYPE scheduler_interval_seconds gauge')
+        for platform, interval in self.intervals.items():
+            lines.append(f'scheduler_interval_seconds{{platform="{platform}"}} {interval}')
+
+        for name, key, help_text in (
+            ('scheduler_last_tick_duration_seconds', 'duration', 'Wall-clock duration of the last tick.'),
+            ('scheduler_last_tick_lag_seconds', 'lag', 'Delay between the scheduled and actual start of the last tick.'),
+            ('scheduler_last_tick_rows_written', 'rows_written', 'Rows written by the last tick.'),
+            ('scheduler_last_tick_rows_skipped', 'rows_skipped', 'Unchanged rows skipped by the last tick.'),
+            ('scheduler_last_tick_failed_shards', 'failed_shards', 'Shards that failed in the last tick.'),
+            ('scheduler_last_tick_timestamp_seconds', 'started_at', 'Start time of the last tick.'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            for platform, record in latest.items():
+                lines.append(f'{name}{{platform="{platform}"}} {record[key]}')
+
+        lines.append('# HELP scheduler_last_tick_stage_seconds Time spent per stage in the last tick, summed across shards.')
+        lines.append('# TYPE scheduler_last_tick_stage_seconds gauge')
+        for platform, record in latest.items():
+            for stage in ('fetch', 'transform', 'write'):
+                lines.append(
+                    f'scheduler_last_tick_stage_seconds{{platform="{platform}",stage="{stage}"}} {record[stage + "_time"]}'
+                )
+        return '\n'.join(lines) + '\n'
+
+    async def _handle_metrics_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve GET /metrics (Prometheus) and GET /ticks (JSON tick history)"""
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            path = parts[1] if len(parts) > 1 else '/'
+            if path == '/metrics':
+                status, content_type, body = '200 OK', 'text/plain; version=0.0.4', self.render_metrics()
+            elif path == '/ticks':
+                status, content_type, body = '200 OK', 'application/json', json.dumps(list(self.history))
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', 'Not Found\n'
+            payload = body.encode()
+            writer.write(
+                f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n'.encode() + payload
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve_metrics(self, port: int) -> asyncio.AbstractServer:
+        """Start the scrape endpoint on the given port"""
+        server = await asyncio.start_server(self._handle_metrics_request, host='0.0.0.0', port=port)
+        print(f"Scheduler metrics available at http://localhost:{port}/metrics")
+        return server
+
+def load_intervals(platforms) -> Dict[str, float]:
+    """Per-platform interval from SCHEDULE_INTERVAL_<PLATFORM>, falling back to SCHEDULE_INTERVAL"""
+    default = float(os.getenv('SCHEDULE_INTERVAL', DEFAULT_INTERVAL))
+    return {
+        platform: float(os.getenv(f'SCHEDULE_INTERVAL_{platform.upper()}', default))
+        for platform in platforms
+    }
 
 async def run_scheduler():
-    """Run the data fetcher every minute"""
+    """Run the data fetcher for each platform on a fixed-rate schedule"""
     # Initialize database tables
     Base.metadata.create_all(bind=engine)
-    
+
     fetcher = DataFetcher()
-    while True:
-        print(f"\nStarting scheduled fetch at {datetime.now()}")
-        await fetcher.fetch_all()
-        print(f"\nCompleted fetch at {datetime.now()}")
-        print(f"Next fetch scheduled for {datetime.now() + timedelta(minutes=1)}")
-        await asyncio.sleep(60)
+    scheduler = Scheduler(
+        fetcher,
+        intervals=load_intervals(fetcher.apis),
+        overrun_policy=os.getenv('SCHEDULE_OVERRUN_POLICY', DEFAULT_OVERRUN_POLICY),
+        drain_timeout=float(os.getenv('SCHEDULER_DRAIN_TIMEOUT', DEFAULT_DRAIN_TIMEOUT)),
+        maintenance_interval=float(os.getenv('HISTORY_MAINTENANCE_INTERVAL', DEFAULT_MAINTENANCE_INTERVAL))
+    )
+
+    loop = asyncio.get_event_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, scheduler.stop)
+        except NotImplementedError:
+            pass
+
+    server = None
+    metrics_port = int(os.getenv('SCHEDULER_METRICS_PORT', DEFAULT_METRICS_PORT))
+    if metrics_port:
+        server = await scheduler.serve_metrics(metrics_port)
+    try:
+        await scheduler.run()
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        await fetcher.close()
 
 if __name__ == "__main__":
     print("Starting metrics fetcher scheduler...")
@@ -41,4 +319,5 @@ if __name__ == "__main__":
     try:
         asyncio.run(run_scheduler())
     except KeyboardInterrupt:
-        print("\nScheduler stopped by user")
+        pass
+    print("\nScheduler stopped")
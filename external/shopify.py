@@ -1,25 +1,28 @@
 from datetime import datetime
 import random
+from typing import Optional
 from .base import BaseAPI
 
 class ShopifyAPI(BaseAPI):
     def __init__(self):
         super().__init__("shopify")
 
-    def generate_merchant_metrics(self, merchant_id: str, merchant_name: str) -> dict:
+    def generate_merchant_metrics(self, merchant_id: str, merchant_name: str,
+                                  rng: Optional[random.Random] = None) -> dict:
         """Generate Shopify-specific metrics and transform to normalized format"""
+        rng = rng or random
         # Shopify-specific metrics
         shopify_metrics = {
             "shop_id": merchant_id,
             "shop_name": merchant_name,
-            "gross_sales": round(random.uniform(10000, 1000000), 2),
-            "orders_count": random.randint(100, 10000),
-            "average_order_amount": round(random.uniform(50, 500), 2),
-            "customer_count": random.randint(50, 5000),
-            "product_count": random.randint(10, 1000),
-            "abandoned_cart_rate": round(random.uniform(0.1, 0.3), 2),
-            "shopify_plus": random.choice([True, False]),
-            "app_usage": random.randint(1, 20)
+            "gross_sales": round(rng.uniform(10000, 1000000), 2),
+            "orders_count": rng.randint(100, 10000),
+            "average_order_amount": round(rng.uniform(50, 500), 2),
+            "customer_count": rng.randint(50, 5000),
+            "product_count": rng.randint(10, 1000),
+            "abandoned_cart_rate": round(rng.uniform(0.1, 0.3), 2),
+            "shopify_plus": rng.choice([True, False]),
+            "app_usage": rng.randint(1, 20)
         }
 
         # Transform to normalized format
@@ -1,25 +1,28 @@
 from datetime import datetime
 import random
+from typing import Optional
 from .base import BaseAPI
 
 class WooCommerceAPI(BaseAPI):
     def __init__(self):
         super().__init__("woocommerce")
 
-    def generate_merchant_metrics(self, merchant_id: str, merchant_name: str) -> dict:
+    def generate_merchant_metrics(self, merchant_id: str, merchant_name: str,
+                                  rng: Optional[random.Random] = None) -> dict:
         """Generate WooCommerce-specific metrics and transform to normalized format"""
+        rng = rng or random
         # WooCommerce-specific metrics
         wc_metrics = {
             "store_id": merchant_id,
             "store_name": merchant_name,
-            "net_sales": round(random.uniform(10000, 1000000), 2),
-            "order_volume": random.randint(100, 10000),
-            "avg_order_total": round(random.uniform(50, 500), 2),
-            "registered_users": random.randint(50, 5000),
-            "published_products": random.randint(10, 1000),
-            "woocommerce_version": f"{random.randint(5, 8)}.{random.randint(0, 9)}.{random.randint(0, 9)}",
-            "active_plugins": random.randint(5, 30),
-            "payment_gateways": random.randint(1, 5)
+            "net_sales": round(rng.uniform(10000, 1000000), 2),
+            "order_volume": rng.randint(100, 10000),
+            "avg_order_total": round(rng.uniform(50, 500), 2),
+            "registered_users": rng.randint(50, 5000),
+            "published_products": rng.randint(10, 1000),
+            "woocommerce_version": f"{rng.randint(5, 8)}.{rng.randint(0, 9)}.{rng.randint(0, 9)}",
+            "active_plugins": rng.randint(5, 30),
+            "payment_gateways": rng.randint(1, 5)
         }
 
         # Transform to normalized format